@@ -1,32 +1,32 @@
 import os
 import sys
-import re
-import base64
-from typing import Tuple
 
 from decomposed_pdf import DecomposedPDF
 
 
-def decode_data_uri(data_uri: str) -> Tuple[bytes, str]:
+def _file_ext(ext: str) -> str:
     """
-    Decode a data URI of the form: data:<mime>;base64,<payload>
-    Returns (bytes, ext) where ext is derived from mime (png/jpg).
+    Normalise an image extension from DecomposedPDF for use as a file suffix.
     """
-    m = re.match(r"^data:([^;]+);base64,(.*)$", data_uri, flags=re.IGNORECASE | re.DOTALL)
-    if not m:
-        raise ValueError("Unexpected data URI format")
-    mime = m.group(1).lower().strip()
-    payload_b64 = m.group(2)
-    blob = base64.b64decode(payload_b64)
-
-    if mime == "image/png":
-        ext = "png"
-    elif mime in ("image/jpeg", "image/jpg"):
-        ext = "jpg"
-    else:
-        # Default to png if unknown (should not happen with the current DecomposedPDF)
-        ext = "png"
-    return blob, ext
+    ext = (ext or "png").lower()
+    return "jpg" if ext == "jpeg" else ext
+
+
+def _write_blob(fpath: str, blob: bytes):
+    """
+    Write blob to fpath with raw os.write calls, bypassing Python's buffered file layer.
+    """
+    fd = os.open(fpath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(blob)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+        # The file won't be read back, so let the kernel drop it from the page cache
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
 
 
 def main():
@@ -45,23 +45,21 @@ def main():
     os.makedirs(out_dir, exist_ok=True)
 
     # Analyze the PDF (local only)
-    dp = DecomposedPDF(pdf_path)
-    print(f"Loaded PDF with {dp.page_count} page(s). Extracting visuals...")
+    with DecomposedPDF(pdf_path) as dp:
+        print(f"Loaded PDF with {dp.page_count} page(s). Extracting visuals...")
 
-    dp.extract_embedded_images()
-    dp.detect_vector_regions()
-    dp.render_vector_regions()
+        # Single pass over the pages; the raw blobs skip the data URI round-trip entirely
+        dp.analyze(include_text=False)
 
     # Write embedded images
     embedded_count = 0
-    if dp.embedded_images:
-        for i, (page_idx, uri) in enumerate(dp.embedded_images, start=1):
+    if dp.embedded_images_raw:
+        for i, (page_idx, blob, ext) in enumerate(dp.embedded_images_raw, start=1):
             try:
-                blob, ext = decode_data_uri(uri)
+                ext = _file_ext(ext)
                 fname = f"{base}.page-{page_idx+1:03d}.img-{i:03d}.{ext}"
                 fpath = os.path.join(out_dir, fname)
-                with open(fpath, "wb") as f:
-                    f.write(blob)
+                _write_blob(fpath, blob)
                 embedded_count += 1
             except Exception as e:
                 print(f"Warning: failed to write embedded image {i} (page {page_idx+1}): {e}")
@@ -70,14 +68,13 @@ def main():
 
     # Write vector clips
     vector_count = 0
-    if dp.vector_clips:
-        for i, (page_idx, uri) in enumerate(dp.vector_clips, start=1):
+    if dp.vector_clips_raw:
+        for i, (page_idx, blob, ext) in enumerate(dp.vector_clips_raw, start=1):
             try:
-                blob, ext = decode_data_uri(uri)
+                ext = _file_ext(ext)
                 fname = f"{base}.page-{page_idx+1:03d}.vector-{i:03d}.{ext}"
                 fpath = os.path.join(out_dir, fname)
-                with open(fpath, "wb") as f:
-                    f.write(blob)
+                _write_blob(fpath, blob)
                 vector_count += 1
             except Exception as e:
                 print(f"Warning: failed to write vector clip {i} (page {page_idx+1}): {e}")
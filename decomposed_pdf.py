@@ -1,53 +1,116 @@
 # decomposed_pdf.py
+import hashlib
 import io
+import json
 import os
-import base64
-from collections import defaultdict
-from dataclasses import dataclass, field
-from typing import List, Tuple, Dict
+import shutil
+import tempfile
+from collections import defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, Deque, Iterable, List, Optional, Tuple, Dict
 
 import fitz  # PyMuPDF
+import numpy as np
 from PIL import Image
 
+try:
+    import pybase64  # SIMD-accelerated drop-in for base64
+except ImportError:
+    import base64 as pybase64
+
+
+# Bump when the extraction/encoding logic changes so older cached results are not reused
+_CACHE_VERSION = 1
+_CACHE_MAX_ENTRIES = int(os.environ.get("DECOMPOSED_PDF_CACHE_ENTRIES", "32"))
+
+# Formats the vision API accepts as-is; anything else is re-encoded to PNG
+_PASSTHROUGH_MIME = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+
 
 def _to_data_uri(image_bytes: bytes, ext: str) -> str:
     ext = (ext or "").lower()
-    if ext in ("jpg", "jpeg"):
-        mime = "image/jpeg"
-    elif ext == "png":
-        mime = "image/png"
-    else:
+    mime = _PASSTHROUGH_MIME.get(ext)
+    if mime is None:
         img = Image.open(io.BytesIO(image_bytes))
         buf = io.BytesIO()
         img.save(buf, format="PNG", optimize=True)
         image_bytes = buf.getvalue()
         mime = "image/png"
-    b64 = base64.b64encode(image_bytes).decode("ascii")
-    return f"data:{mime};base64,{b64}"
+    # Assemble as bytes and decode once, rather than decoding the payload and then copying it into an f-string
+    header = b"data:" + mime.encode("ascii") + b";base64,"
+    return (header + pybase64.b64encode(image_bytes)).decode("ascii")
+
 
+def _probe_size(image_bytes: bytes) -> Tuple[int, int]:
+    # Image.open only parses the header; no pixels are decoded here
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        return img.size
 
-def _resize_if_needed(image_bytes: bytes, ext: str, max_dim: int) -> Tuple[bytes, str]:
+
+def _do_resize(image_bytes: bytes, ext: str, max_dim: int) -> Tuple[bytes, str]:
+    img = Image.open(io.BytesIO(image_bytes))
+    w, h = img.size
+    is_jpeg = (ext or "").lower() in ("jpg", "jpeg")
+    scale = max_dim / max(w, h)
+    # Round the width (Pillow's row length) down to a multiple of 16 so rows stay aligned for the
+    # resize and encoders, then take the height from that same scale to keep the aspect ratio.
+    # Rounding down can only shrink, so both sides stay within max_dim; widths under 16 are left alone.
+    new_w = int(w * scale) // 16 * 16
+    if new_w >= 16:
+        scale = new_w / w
+    else:
+        new_w = max(1, int(w * scale))
+    new_size = (new_w, max(1, round(h * scale)))
+    if is_jpeg:
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of decoding every pixel
+        img.draft("RGB", new_size)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    # Past ~3x reduction a cheaper filter is indistinguishable from LANCZOS
+    remaining = new_size[0] / img.size[0]
+    resample = Image.Resampling.BILINEAR if remaining < 0.33 else Image.Resampling.LANCZOS
+    img = img.resize(new_size, resample)
+    buf = io.BytesIO()
+    if is_jpeg:
+        img.save(buf, format="JPEG", quality=85, optimize=True)
+        return buf.getvalue(), "jpeg"
+    else:
+        img.save(buf, format="PNG", optimize=True)
+        return buf.getvalue(), "png"
+
+
+def _resize_if_needed(
+    image_bytes: bytes, ext: str, max_dim: int, size: Optional[Tuple[int, int]] = None
+) -> Tuple[bytes, str]:
+    """
+    Downscales the image if its longest side exceeds max_dim, otherwise returns the bytes untouched.
+    Pass size when the dimensions are already known (e.g. from PyMuPDF) to skip probing the image.
+    """
     try:
-        img = Image.open(io.BytesIO(image_bytes))
-        w, h = img.size
+        w, h = size if size and all(size) else _probe_size(image_bytes)
         if max_dim and max(w, h) > max_dim:
-            scale = max_dim / max(w, h)
-            new_size = (max(1, int(w * scale)), max(1, int(h * scale)))
-            if img.mode not in ("RGB", "L"):
-                img = img.convert("RGB")
-            img = img.resize(new_size, Image.LANCZOS)
-            buf = io.BytesIO()
-            if (ext or "").lower() in ("jpg", "jpeg"):
-                img.save(buf, format="JPEG", quality=85, optimize=True)
-                return buf.getvalue(), "jpeg"
-            else:
-                img.save(buf, format="PNG", optimize=True)
-                return buf.getvalue(), "png"
+            return _do_resize(image_bytes, ext, max_dim)
     except Exception:
         pass
     return image_bytes, (ext or "").lower()
 
 
+@dataclass
+class _PageResult:
+    index: int
+    text: str = ""
+    images: List[Tuple[int, bytes, str]] = field(default_factory=list)
+    # (page_idx, (x0, y0, x1, y1)); plain tuples so results can cross process boundaries
+    vectors: List[Tuple[int, Tuple[float, float, float, float]]] = field(default_factory=list)
+
+
 @dataclass
 class DecomposedPDF:
     pdf_path: str
@@ -62,8 +125,11 @@ class DecomposedPDF:
     min_vector_area_pt: float = field(default_factory=lambda: float(os.environ.get("MIN_VECTOR_AREA_PT", "5000")))
     region_pad_pt: float = field(default_factory=lambda: float(os.environ.get("REGION_PAD_PT", "6")))
     vector_render_scale: float = field(default_factory=lambda: float(os.environ.get("VECTOR_RENDER_SCALE", "2.0")))
+    vector_render_format: str = field(default_factory=lambda: os.environ.get("VECTOR_RENDER_FORMAT", "jpeg"))  # jpeg or png
     # Text excerpt limit
     max_text_chars: int = field(default_factory=lambda: int(os.environ.get("MAX_TEXT_CHARS", "20000")))
+    # Worker processes for per-page work (1 = sequential in this process)
+    max_workers: int = field(default_factory=lambda: int(os.environ.get("MAX_WORKERS", "1")))
 
     # Populated
     pdf_bytes: bytes = field(init=False, default=b"")
@@ -71,6 +137,15 @@ class DecomposedPDF:
     embedded_images: List[Tuple[int, str]] = field(init=False, default_factory=list)  # (page_idx, data_uri)
     vector_regions: List[Tuple[int, fitz.Rect]] = field(init=False, default_factory=list)  # (page_idx, rect)
     vector_clips: List[Tuple[int, str]] = field(init=False, default_factory=list)  # (page_idx, data_uri)
+    embedded_images_raw: List[Tuple[int, bytes, str]] = field(init=False, default_factory=list)  # (page_idx, bytes, ext)
+    vector_clips_raw: List[Tuple[int, bytes, str]] = field(init=False, default_factory=list)  # (page_idx, bytes, ext)
+    _doc: Optional[fitz.Document] = field(init=False, default=None, repr=False)
+    _pdf_hash: str = field(init=False, default="", repr=False)
+    _text_excerpt: Optional[str] = field(init=False, default=None, repr=False)  # memoized extract_text_excerpt()
+    _visuals_done: bool = field(init=False, default=False, repr=False)
+    # Resized images shared across pages: xref -> (bytes, ext) and blake2b(raw) -> (bytes, ext)
+    _xref_cache: Dict[int, Tuple[bytes, str]] = field(init=False, default_factory=dict, repr=False)
+    _blob_cache: Dict[bytes, Tuple[bytes, str]] = field(init=False, default_factory=dict, repr=False)
 
     def __post_init__(self):
         with open(self.pdf_path, "rb") as f:
@@ -78,11 +153,22 @@ class DecomposedPDF:
         if not self.pdf_bytes:
             raise ValueError("PDF is empty or unreadable")
 
-        doc = fitz.open(stream=self.pdf_bytes, filetype="pdf")
-        try:
-            self.page_count = len(doc)
-        finally:
-            doc.close()
+        self._pdf_hash = hashlib.blake2b(self.pdf_bytes, digest_size=16).hexdigest()
+
+        # Kept open for the lifetime of the instance; see close() / the context manager
+        self._doc = fitz.open(stream=self.pdf_bytes, filetype="pdf")
+        self.page_count = len(self._doc)
+
+    def close(self):
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+
+    def __enter__(self) -> "DecomposedPDF":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
     # ---------- Text extraction (local) ----------
     def extract_text_excerpt(self) -> str:
@@ -90,161 +176,393 @@ class DecomposedPDF:
         Extracts plain text from pages in order and returns the first max_text_chars characters.
         Includes page markers to help the model cite pages.
         """
-        doc = fitz.open(stream=self.pdf_bytes, filetype="pdf")
-        try:
-            chunks: List[str] = []
-            total = 0
-            for i in range(len(doc)):
-                page = doc[i]
-                txt = page.get_text("text") or ""
-                if not txt.strip():
-                    continue
-                header = f"\n\n--- Page {i+1} ---\n"
-                to_add = header + txt
-                remain = self.max_text_chars - total
-                if remain <= 0:
-                    break
-                if len(to_add) > remain:
-                    chunks.append(to_add[:remain])
-                    total += remain
-                    break
-                chunks.append(to_add)
-                total += len(to_add)
-            return "".join(chunks).strip()
-        finally:
-            doc.close()
+        if self._text_excerpt is None:
+            self.analyze(include_text=True, include_visuals=False)
+        return self._text_excerpt
 
-    # ---------- Embedded raster image extraction ----------
-    def extract_embedded_images(self):
-        doc = fitz.open(stream=self.pdf_bytes, filetype="pdf")
-        try:
-            selected: List[Tuple[int, str]] = []
-            total = 0
-            for page_index in range(len(doc)):
-                page = doc[page_index]
-                images = page.get_images(full=True)
-                seen_xrefs = set()
-                candidates = []
-                for img in images:
-                    xref = img[0]
-                    if xref in seen_xrefs:
-                        continue
-                    seen_xrefs.add(xref)
-                    try:
-                        base = doc.extract_image(xref)  # {'image','ext','width','height',...}
-                        w = base.get("width") or 0
-                        h = base.get("height") or 0
-                        area = w * h
-                        if area < self.min_image_area:
-                            continue
-                        candidates.append((area, base))
-                    except Exception:
-                        continue
+    def _assemble_text(self, page_texts: List[Tuple[int, str]]) -> str:
+        chunks: List[str] = []
+        total = 0
+        for i, txt in page_texts:
+            if not txt.strip():
+                continue
+            header = f"\n\n--- Page {i+1} ---\n"
+            to_add = header + txt
+            remain = self.max_text_chars - total
+            if remain <= 0:
+                break
+            if len(to_add) > remain:
+                chunks.append(to_add[:remain])
+                total += remain
+                break
+            chunks.append(to_add)
+            total += len(to_add)
+        return "".join(chunks).strip()
+
+    # ---------- Per-page work, optionally across processes ----------
+    def _map_pages(
+        self,
+        method: str,
+        items: Iterable[Any],
+        args: Tuple = (),
+        consume: Optional[Callable[[Any], bool]] = None,
+    ) -> List[Any]:
+        """
+        Calls self.<method>(doc, item, *args) for each item and returns the non-None results in item order.
+        consume(result) is called on each result in order; once it returns True the remaining items are
+        skipped. items is consumed lazily, so it may be a generator that reads state updated by consume.
+        PyMuPDF does not support threads, so with max_workers > 1 the items go to a process pool
+        whose workers each open the PDF from pdf_path; method, items and results must be picklable.
+        """
+        results: List[Any] = []
+
+        def take(res) -> bool:
+            if res is None:
+                return False
+            results.append(res)
+            return consume is not None and consume(res)
 
-                candidates.sort(key=lambda t: t[0], reverse=True)
-                for _, base in candidates[: self.max_images_per_page]:
-                    if total >= self.max_total_images:
+        if self.max_workers <= 1:
+            doc = self._doc if self._doc is not None else fitz.open(stream=self.pdf_bytes, filetype="pdf")
+            try:
+                for item in items:
+                    if take(getattr(self, method)(doc, item, *args)):
                         break
-                    img_bytes = base["image"]
-                    ext = base.get("ext", "png")
-                    img_bytes, ext = _resize_if_needed(img_bytes, ext, self.max_image_dim)
-                    data_uri = _to_data_uri(img_bytes, ext)
-                    selected.append((page_index, data_uri))
-                    total += 1
-                if total >= self.max_total_images:
+            finally:
+                if doc is not self._doc:
+                    doc.close()
+            return results
+
+        settings = {f.name: getattr(self, f.name) for f in fields(self) if f.init}
+        settings["max_workers"] = 1
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker, initargs=(settings,)) as pool:
+            # Only a couple of items per worker are in flight, so later items see up-to-date budgets
+            pending: Deque[Future] = deque()
+            stopped = False
+            for item in items:
+                pending.append(pool.submit(_run_in_worker, method, item, args))
+                if len(pending) >= 2 * self.max_workers and take(pending.popleft().result()):
+                    stopped = True
                     break
-            self.embedded_images = selected
-        finally:
-            doc.close()
+            while pending and not stopped:
+                stopped = take(pending.popleft().result())
+            for fut in pending:
+                fut.cancel()
+        return results
 
-    # ---------- Vector region detection and rendering ----------
-    @staticmethod
-    def _expand_rect(r: fitz.Rect, pad: float) -> fitz.Rect:
-        return fitz.Rect(r.x0 - pad, r.y0 - pad, r.x1 + pad, r.y1 + pad)
+    # ---------- Single-pass page analysis ----------
+    def analyze(self, include_text: bool = True, include_visuals: bool = True):
+        """
+        Walks the pages once, doing text extraction, embedded image extraction and vector region
+        detection for each page before moving on, instead of one full pass per method.
+        Each kind of work stops as soon as its own budget (text chars, images, vector regions) is
+        spent, and the walk ends once all of them are; clips are then rendered only for the vector
+        regions that made the cut. Parts that have already been computed are not redone.
+        """
+        include_text = include_text and self._text_excerpt is None
+        include_visuals = include_visuals and not self._visuals_done
+        if not include_text and not include_visuals:
+            return
+        use_cache = os.environ.get("DECOMPOSED_PDF_NOCACHE", "") != "1"
+        if use_cache:
+            self._load_cache()
+            include_text = include_text and self._text_excerpt is None
+            include_visuals = include_visuals and not self._visuals_done
+            if not include_text and not include_visuals:
+                return
+
+        # Running totals, updated as page results arrive in order
+        text_left = self.max_text_chars if include_text else 0
+        images_left = self.max_total_images if include_visuals else 0
+        regions_left = self.max_vector_regions_total if include_visuals else 0
 
+        def jobs():
+            for page_index in range(self.page_count):
+                yield (page_index, text_left > 0, images_left, regions_left)
+
+        def consume(res: _PageResult) -> bool:
+            nonlocal text_left, images_left, regions_left
+            if res.text.strip():
+                text_left -= len(f"\n\n--- Page {res.index+1} ---\n") + len(res.text)
+            images_left -= len(res.images)
+            regions_left -= len(res.vectors)
+            return text_left <= 0 and images_left <= 0 and regions_left <= 0
+
+        pages = self._map_pages("_analyze_page", jobs(), consume=consume)
+
+        if include_text:
+            self._text_excerpt = self._assemble_text([(p.index, p.text) for p in pages])
+        if include_visuals:
+            images = [img for p in pages for img in p.images]
+            regions = [v for p in pages for v in p.vectors][: self.max_vector_regions_total]
+            self.embedded_images_raw = images[: self.max_total_images]
+            self.vector_regions = [(p, fitz.Rect(*r)) for p, r in regions]
+            self.vector_clips_raw = self._map_pages("_render_region", regions)
+            self._visuals_done = True
+        if use_cache:
+            self._save_cache()
+
+    def _analyze_page(self, doc: fitz.Document, job: Tuple[int, bool, int, int]) -> _PageResult:
+        """
+        job is (page_index, want_text, images_left, regions_left); each kind of work is skipped
+        once its budget is spent.
+        """
+        page_index, want_text, images_left, regions_left = job
+        page = doc[page_index]
+        res = _PageResult(page_index)
+        if want_text:
+            # No single page can contribute more than the whole budget, so don't hold on to more
+            res.text = (page.get_text("text") or "")[: self.max_text_chars]
+        if images_left > 0:
+            res.images = self._page_embedded_images(doc, page, min(images_left, self.max_images_per_page))
+        if regions_left > 0:
+            res.vectors = self._page_vector_regions(page, min(regions_left, self.max_vector_regions_per_page))
+        return res
+
+    # ---------- On-disk cache of analysis results ----------
     @staticmethod
-    def _iou(a: fitz.Rect, b: fitz.Rect) -> float:
-        inter = a & b
-        if inter.is_empty:
-            return 0.0
-        union_area = a.get_area() + b.get_area() - inter.get_area()
-        return inter.get_area() / union_area if union_area > 0 else 0.0
-
-    def _merge_rects(self, rects: List[fitz.Rect], iou_threshold=0.15) -> List[fitz.Rect]:
-        rects = rects[:]
-        changed = True
-        while changed:
-            changed = False
-            out: List[fitz.Rect] = []
-            while rects:
-                r = rects.pop()
-                merged = False
-                for i in range(len(out)):
-                    if self._iou(out[i], r) >= iou_threshold or not (out[i] & r).is_empty:
-                        out[i] = out[i] | r
-                        merged = True
-                        changed = True
-                        break
-                if not merged:
-                    out.append(r)
-            rects = out
-        return rects
+    def _cache_root() -> Optional[str]:
+        """
+        Per-user cache directory, created 0700. Returns None if it can't be created or is
+        not private to this user, in which case the cache is not used at all.
+        """
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        root = os.path.join(base, "decomposed_pdf")
+        try:
+            os.makedirs(root, mode=0o700, exist_ok=True)
+            st = os.stat(root)
+        except OSError:
+            return None
+        if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+            return None
+        return root
 
-    def detect_vector_regions(self):
-        doc = fitz.open(stream=self.pdf_bytes, filetype="pdf")
+    def _cache_dir(self, root: str) -> str:
+        """
+        Cache entry for this PDF's contents, the extraction settings (but not max_workers, which
+        doesn't change the result) and the cache format version.
+        """
+        settings = [getattr(self, f.name) for f in fields(self) if f.init and f.name not in ("pdf_path", "max_workers")]
+        key = hashlib.blake2b(repr((_CACHE_VERSION, settings)).encode("utf-8"), digest_size=8).hexdigest()
+        return os.path.join(root, f"{self._pdf_hash}_{key}")
+
+    def _load_cache(self):
+        root = self._cache_root()
+        if root is None:
+            return
+        entry = self._cache_dir(root)
         try:
-            regions: List[Tuple[int, fitz.Rect]] = []
-            total = 0
-            for page_index in range(len(doc)):
-                page = doc[page_index]
-                draws = page.get_drawings()
-                rects: List[fitz.Rect] = []
-                for d in draws:
-                    r = d.get("rect")
-                    if not r:
-                        continue
-                    if r.get_area() < self.min_vector_area_pt:
-                        continue
-                    rects.append(self._expand_rect(r, self.region_pad_pt))
-                if not rects:
-                    continue
-                merged = self._merge_rects(rects, iou_threshold=0.15)
-                merged.sort(key=lambda R: R.get_area(), reverse=True)
-                kept = 0
-                for R in merged:
-                    if kept >= self.max_vector_regions_per_page or total >= self.max_vector_regions_total:
-                        break
-                    regions.append((page_index, R))
-                    kept += 1
-                    total += 1
-                if total >= self.max_vector_regions_total:
-                    break
+            with open(os.path.join(entry, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != _CACHE_VERSION:
+                return
+            visuals = meta.get("visuals")
+            if visuals is not None:
+                # Blob file names are derived from list positions, never taken from the metadata
+                images = []
+                for i, (p, ext) in enumerate(visuals["images"]):
+                    with open(os.path.join(entry, f"img-{i:03d}.bin"), "rb") as f:
+                        images.append((int(p), f.read(), str(ext)))
+                clips = []
+                for i, (p, ext) in enumerate(visuals["clips"]):
+                    with open(os.path.join(entry, f"clip-{i:03d}.bin"), "rb") as f:
+                        clips.append((int(p), f.read(), str(ext)))
+                regions = [(int(p), fitz.Rect(*map(float, r))) for p, r in visuals["regions"]]
+        except Exception:
+            # Missing or unreadable cache: just analyze from scratch
+            return
+        if self._text_excerpt is None and isinstance(meta.get("text"), str):
+            self._text_excerpt = meta["text"]
+        if not self._visuals_done and visuals is not None:
+            self.embedded_images_raw = images
             self.vector_regions = regions
-        finally:
-            doc.close()
+            self.vector_clips_raw = clips
+            self._visuals_done = True
 
-    def render_vector_regions(self):
-        if not self.vector_regions:
-            self.vector_clips = []
+    def _save_cache(self):
+        root = self._cache_root()
+        if root is None:
             return
-        doc = fitz.open(stream=self.pdf_bytes, filetype="pdf")
+        meta: Dict[str, Any] = {"version": _CACHE_VERSION, "text": self._text_excerpt, "visuals": None}
+        if self._visuals_done:
+            meta["visuals"] = {
+                "images": [[p, ext] for p, _, ext in self.embedded_images_raw],
+                "regions": [[p, [r.x0, r.y0, r.x1, r.y1]] for p, r in self.vector_regions],
+                "clips": [[p, ext] for p, _, ext in self.vector_clips_raw],
+            }
+        entry = self._cache_dir(root)
         try:
-            out: List[Tuple[int, str]] = []
-            mat = fitz.Matrix(self.vector_render_scale, self.vector_render_scale)
-            for page_index, rect in self.vector_regions:
-                if page_index < 0 or page_index >= len(doc):
-                    continue
-                page = doc[page_index]
+            # Build the entry in a private temp dir and swap it into place
+            tmp = tempfile.mkdtemp(dir=root)
+        except OSError:
+            return
+        try:
+            for i, (_, blob, _) in enumerate(self.embedded_images_raw if self._visuals_done else []):
+                with open(os.path.join(tmp, f"img-{i:03d}.bin"), "wb") as f:
+                    f.write(blob)
+            for i, (_, blob, _) in enumerate(self.vector_clips_raw if self._visuals_done else []):
+                with open(os.path.join(tmp, f"clip-{i:03d}.bin"), "wb") as f:
+                    f.write(blob)
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self._prune_cache(root)
+
+    @staticmethod
+    def _prune_cache(root: str):
+        # Keep only the most recently written entries
+        try:
+            entries = [os.path.join(root, name) for name in os.listdir(root)]
+            entries.sort(key=os.path.getmtime, reverse=True)
+        except OSError:
+            return
+        for stale in entries[_CACHE_MAX_ENTRIES:]:
+            shutil.rmtree(stale, ignore_errors=True)
+
+    # ---------- Embedded raster image extraction ----------
+    def _page_embedded_images(self, doc: fitz.Document, page: fitz.Page, limit: int) -> List[Tuple[int, bytes, str]]:
+        # get_images() tuples carry the width/height from each image's dictionary (items 2 and 3),
+        # so candidates are filtered and ranked without decoding anything; only the kept ones are extracted
+        seen_xrefs = set()
+        candidates = []
+        for img in page.get_images(full=True):
+            xref = img[0]
+            if xref in seen_xrefs:
+                continue
+            seen_xrefs.add(xref)
+            area = (img[2] or 0) * (img[3] or 0)
+            if area < self.min_image_area:
+                continue
+            candidates.append((area, xref))
+
+        candidates.sort(key=lambda t: t[0], reverse=True)
+        out: List[Tuple[int, bytes, str]] = []
+        for _, xref in candidates:
+            if len(out) >= limit:
+                break
+            # Images reused across pages (logos, letterheads) are only extracted and resized once
+            cached = self._xref_cache.get(xref)
+            if cached is None:
                 try:
-                    pix = page.get_pixmap(matrix=mat, clip=rect, alpha=False)
-                    png_bytes = pix.tobytes("png")
-                    data_uri = _to_data_uri(png_bytes, "png")
-                    out.append((page_index, data_uri))
+                    base = doc.extract_image(xref)  # {'image','ext','width','height',...}
                 except Exception:
                     continue
-            self.vector_clips = out
-        finally:
-            doc.close()
+                if not base:
+                    continue
+                # Identical bytes stored under different xrefs share one resized copy too
+                digest = hashlib.blake2b(base["image"], digest_size=16).digest()
+                cached = self._blob_cache.get(digest)
+                if cached is None:
+                    size = (base.get("width") or 0, base.get("height") or 0)
+                    cached = _resize_if_needed(base["image"], base.get("ext", "png"), self.max_image_dim, size=size)
+                self._blob_cache[digest] = cached
+                self._xref_cache[xref] = cached
+            img_bytes, ext = cached
+            out.append((page.number, img_bytes, ext))
+        return out
+
+    def extract_embedded_images_raw(self):
+        """
+        Populates embedded_images_raw with (page_idx, bytes, ext) without base64-encoding.
+        """
+        self.analyze()
+
+    def extract_embedded_images(self):
+        self.extract_embedded_images_raw()
+        self.embedded_images = [(p, _to_data_uri(blob, ext)) for p, blob, ext in self.embedded_images_raw]
+
+    # ---------- Vector region detection and rendering ----------
+    @staticmethod
+    def _merge_rects(rects: np.ndarray) -> np.ndarray:
+        """
+        Merges overlapping rects, given as an (N, 4) array of x0, y0, x1, y1, into their bounding
+        boxes until no two results overlap.
+        Each round is a sweep along x with a union-find over the overlap graph; another round
+        is only needed when a merged bbox grows into a rect that none of its members touched.
+        """
+        while True:
+            n = len(rects)
+            rects = rects[np.argsort(rects[:, 0], kind="stable")]
+            x0, y0, x1, y1 = rects.T
+            parent = np.arange(n)
+
+            def find(i: int) -> int:
+                while parent[i] != i:
+                    parent[i] = parent[parent[i]]
+                    i = parent[i]
+                return i
+
+            merged_any = False
+            # Sorted by x0, so rects i+1..end-1 are exactly those starting before rect i ends
+            ends = np.searchsorted(x0, x1, side="left").tolist()
+            for i in range(n):
+                end = ends[i]
+                # Scalar early-out before touching any arrays: most rects have no x-overlapping neighbour
+                if end <= i + 1:
+                    continue
+                lo = i + 1
+                mask = (x1[lo:end] > x0[i]) & (y0[lo:end] < y1[i]) & (y1[lo:end] > y0[i])
+                for k in (np.flatnonzero(mask) + lo).tolist():
+                    ri, rk = find(i), find(k)
+                    if ri != rk:
+                        parent[ri] = rk
+                        merged_any = True
+
+            if not merged_any:
+                return rects
+            roots = np.array([find(i) for i in range(n)])
+            _, group = np.unique(roots, return_inverse=True)
+            lo = np.full((group.max() + 1, 2), np.inf)
+            hi = np.full((group.max() + 1, 2), -np.inf)
+            np.minimum.at(lo, group, rects[:, :2])
+            np.maximum.at(hi, group, rects[:, 2:])
+            rects = np.hstack([lo, hi])
+
+    def _page_vector_regions(self, page: fitz.Page, limit: int) -> List[Tuple[int, Tuple[float, float, float, float]]]:
+        raw = [d.get("rect") for d in page.get_drawings()]
+        R = np.array([(r.x0, r.y0, r.x1, r.y1) for r in raw if r], dtype=np.float64).reshape(-1, 4)
+        areas = np.clip(R[:, 2] - R[:, 0], 0, None) * np.clip(R[:, 3] - R[:, 1], 0, None)
+        R = R[areas >= self.min_vector_area_pt]
+        if not len(R):
+            return []
+        pad = self.region_pad_pt
+        R += np.array([-pad, -pad, pad, pad])
+        merged = self._merge_rects(R)
+        merged_areas = (merged[:, 2] - merged[:, 0]) * (merged[:, 3] - merged[:, 1])
+        top = np.argsort(-merged_areas, kind="stable")[:limit]
+        return [(page.number, tuple(merged[k].tolist())) for k in top]
+
+    def _render_region(
+        self, doc: fitz.Document, region: Tuple[int, Tuple[float, float, float, float]]
+    ) -> Optional[Tuple[int, bytes, str]]:
+        page_index, rect = region
+        try:
+            page = doc[page_index]
+            mat = fitz.Matrix(self.vector_render_scale, self.vector_render_scale)
+            pix = page.get_pixmap(matrix=mat, clip=fitz.Rect(*rect), alpha=False)
+            fmt = self.vector_render_format.lower()
+            if fmt in ("jpg", "jpeg"):
+                return (page.number, pix.tobytes("jpeg", jpg_quality=85), "jpeg")
+            return (page.number, pix.tobytes("png"), "png")
+        except Exception:
+            return None
+
+    def detect_vector_regions(self):
+        self.analyze()
+
+    def render_vector_regions_raw(self):
+        """
+        Populates vector_clips_raw with (page_idx, bytes, ext) without base64-encoding.
+        """
+        self.analyze()
+
+    def render_vector_regions(self):
+        self.render_vector_regions_raw()
+        self.vector_clips = [(p, _to_data_uri(blob, ext)) for p, blob, ext in self.vector_clips_raw]
 
     # ---------- Build Chat Completions multimodal user parts ----------
     def build_user_parts(self, instruction: str, include_text_excerpt: bool = True) -> List[Dict]:
@@ -255,14 +573,21 @@ class DecomposedPDF:
                 parts.append({"type": "text", "text": "Extracted text excerpt (may be truncated):\n" + excerpt})
 
         # Group visuals by page so the model can cite page numbers
-        by_page: Dict[int, Dict[str, List[str]]] = defaultdict(lambda: {"images": [], "vectors": []})
-        for p, uri in self.embedded_images:
-            by_page[p]["images"].append(uri)
-        for p, uri in self.vector_clips:
-            by_page[p]["vectors"].append(uri)
+        # Raw blobs are only encoded to data URIs here, when actually sent
+        by_page: Dict[int, Dict[str, List[Tuple[bytes, bytes, str]]]] = defaultdict(lambda: {"images": [], "vectors": []})
+        pages_by_digest: Dict[bytes, List[int]] = defaultdict(list)
+
+        for kind, visuals in (("images", self.embedded_images_raw), ("vectors", self.vector_clips_raw)):
+            for p, blob, ext in visuals:
+                digest = hashlib.blake2b(blob, digest_size=16).digest()
+                by_page[p][kind].append((digest, blob, ext))
+                if p not in pages_by_digest[digest]:
+                    pages_by_digest[digest].append(p)
 
         if by_page:
             parts.append({"type": "text", "text": "Extracted visuals by page:"})
+            # Identical visuals (e.g. a logo on every page) are uploaded once, on the first page they appear
+            sent = set()
             for page_index in sorted(by_page.keys()):
                 bucket = by_page[page_index]
                 label_bits = []
@@ -271,9 +596,28 @@ class DecomposedPDF:
                 if bucket["vectors"]:
                     label_bits.append(f"{len(bucket['vectors'])} vector clip(s)")
                 parts.append({"type": "text", "text": f"Page {page_index + 1} ({', '.join(label_bits)}):"})
-                for uri in bucket["images"]:
-                    parts.append({"type": "image_url", "image_url": {"url": uri, "detail": "auto"}})
-                for uri in bucket["vectors"]:
-                    parts.append({"type": "image_url", "image_url": {"url": uri, "detail": "auto"}})
+                for digest, blob, ext in bucket["images"] + bucket["vectors"]:
+                    pages = sorted(pages_by_digest[digest])
+                    if digest in sent:
+                        parts.append({"type": "text", "text": f"(same image as page {pages[0] + 1})"})
+                        continue
+                    sent.add(digest)
+                    if len(pages) > 1:
+                        others = ", ".join(str(p + 1) for p in pages[1:])
+                        parts.append({"type": "text", "text": f"(also appears on page(s) {others})"})
+                    parts.append({"type": "image_url", "image_url": {"url": _to_data_uri(blob, ext), "detail": "auto"}})
 
         return parts
+
+
+# ---------- Process pool workers (see DecomposedPDF._map_pages) ----------
+_worker_pdf: Optional[DecomposedPDF] = None
+
+
+def _init_worker(settings: Dict[str, Any]):
+    global _worker_pdf
+    _worker_pdf = DecomposedPDF(**settings)
+
+
+def _run_in_worker(method: str, item: Any, args: Tuple) -> Any:
+    return getattr(_worker_pdf, method)(_worker_pdf._doc, item, *args)
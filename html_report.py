@@ -8,17 +8,9 @@ def write_html_report(output_path: str, pdf_path: str, model: str, questions: li
     questions and answers are zipped together; if lengths differ, extra items are ignored.
     """
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    sections_html = []
-    for i, (q, a) in enumerate(zip(questions, answers), start=1):
-        q = q or "(no question)"
-        a = a or "(no reply)"
-        sections_html.append(f"""
-      <div class="card">
-        <h2>{i}) {escape(q[:160]) + ('…' if len(q) > 160 else '')}</h2>
-        <div class="answer"><pre>{escape(a)}</pre></div>
-      </div>""")
-
-    html = f"""<!doctype html>
+    # Sections are written one at a time rather than joined into a single document string
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(f"""<!doctype html>
 <html lang="en">
 <head>
   <meta charset="utf-8">
@@ -40,9 +32,16 @@ def write_html_report(output_path: str, pdf_path: str, model: str, questions: li
     Model: {escape(model)}<br>
     Generated: {escape(ts)}
   </div>
-  {''.join(sections_html)}
+  """)
+        for i, (q, a) in enumerate(zip(questions, answers), start=1):
+            q = q or "(no question)"
+            a = a or "(no reply)"
+            title = escape(q[:160]) + ("\u2026" if len(q) > 160 else "")
+            f.write(f"""
+      <div class="card">
+        <h2>{i}) {title}</h2>
+        <div class="answer"><pre>{escape(a)}</pre></div>
+      </div>""")
+        f.write("""
 </body>
-</html>"""
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(html)
-
+</html>""")
@@ -42,19 +42,16 @@ def main():
     client = OpenAI(api_key=api_key)
 
     # 1) Decompose the PDF locally
-    questionDP = DecomposedPDF(question_pdf_path)
-    print(f"Loaded question PDF with {questionDP.page_count} page(s). Extracting visuals...")
-    questionDP.extract_embedded_images()
-    questionDP.detect_vector_regions()
-    questionDP.render_vector_regions()
+    # analyze() caches everything the questions need, so the documents can be closed straight away
+    with DecomposedPDF(question_pdf_path) as questionDP:
+        print(f"Loaded question PDF with {questionDP.page_count} page(s). Extracting visuals...")
+        questionDP.analyze()
 
     answerDP = None
     if answer_pdf_path != "":
-        answerDP = DecomposedPDF(answer_pdf_path)
-        print(f"Loaded answer PDF with {answerDP.page_count} page(s). Extracting visuals...")
-        answerDP.extract_embedded_images()
-        answerDP.detect_vector_regions()
-        answerDP.render_vector_regions()
+        with DecomposedPDF(answer_pdf_path) as answerDP:
+            print(f"Loaded answer PDF with {answerDP.page_count} page(s). Extracting visuals...")
+            answerDP.analyze()
 
     # 2) Conversation setup
     system_prompt = (
@@ -10,7 +10,7 @@ if [[ ! -e "${ACTIVATE}" ]]; then
     source ${ACTIVATE}
 
     pip3 install --upgrade pip
-    pip3 install openai pymupdf pillow
+    pip3 install openai pymupdf pillow pybase64 numpy
 
     ## This part adds the venv to Jupyter
     #if [[ ! -e "${KERNEL_PATH}/${ENV_NAME}" ]]; then